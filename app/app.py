@@ -1,12 +1,16 @@
 # app/app.py
-import os, json
+import os, json, math
 import numpy as np
-from PIL import Image
+try:
+    import orjson  # optional, faster JSON
+except ImportError:
+    orjson = None
 from PySide6 import QtCore, QtGui, QtWidgets
 from PySide6.QtCore import Qt, QRectF, QPointF
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QFileDialog, QGraphicsView, QGraphicsScene,
-    QGraphicsPixmapItem, QGraphicsRectItem, QGraphicsLineItem, QGraphicsSimpleTextItem,
+    QGraphicsItem, QGraphicsPixmapItem, QGraphicsRectItem, QGraphicsLineItem,
     QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox,
     QDoubleSpinBox, QMessageBox, QToolButton, QButtonGroup
 )
@@ -14,24 +18,174 @@ from lib.aruco_utils import detect_aruco_scale, rectify_topdown_with_aruco
 
 APP_TITLE = "Veichi Annotator (M1.6)"
 
-def qimage_from_pil(img):
-    return QtGui.QImage(img.tobytes(), img.size[0], img.size[1], img.size[0]*3,
-                        QtGui.QImage.Format_RGB888)
+_LABELS_CFG = None
+
+def _load_labels_cfg():
+    """Parse config/labels.json once per process."""
+    global _LABELS_CFG
+    if _LABELS_CFG is None:
+        path = os.path.join(os.path.dirname(__file__),"config","labels.json")
+        with open(path,"rb") as f: data = f.read()
+        _LABELS_CFG = orjson.loads(data) if orjson else json.loads(data)
+    return _LABELS_CFG
+
+# Shape table: one record per annotation in drawing order (undo pops the tail).
+# Boxes keep x,y,w,h in `pts`, lines x1,y1,x2,y2; NaN marks an unmeasured value.
+_SHAPE_BOX, _SHAPE_LINE = 0, 1
+_SHAPE_DTYPE = np.dtype([("kind","u1"), ("label","i2"), ("pts","f8",(4,)),
+                         ("mm","f8"), ("mm_c","f8"), ("depth","f8")])
+
+def _none_if_nan(v):
+    return None if v != v else v
+
+def _gl_available():
+    """True if the platform can actually create an OpenGL context (not e.g. over RDP/VMs)."""
+    if os.environ.get("VEICHI_NO_GL"):
+        return False
+    return QtGui.QOpenGLContext().create()
+
+# native QImage -> QPixmap conversion (bound once; never QPixmap(qimage))
+_pix_from_image = QtGui.QPixmap.fromImage
+
+def qimage_from_bgr(arr):
+    """Wrap a C-contiguous HxWx3 BGR uint8 array as a QImage (no copy, no channel swap).
+    Keep the array alive while the QImage is used."""
+    return QtGui.QImage(arr.data, arr.shape[1], arr.shape[0], arr.strides[0],
+                        QtGui.QImage.Format_BGR888)
+
+# longest side of the on-screen pixmap; img_np (detection/measurement) stays full-res
+_DISPLAY_MAX_DIM = 3000
+
+def display_qimage(bgr):
+    """
+    QImage for showing `bgr`, downsampled once if larger than _DISPLAY_MAX_DIM.
+    Returns (qimage, backing_array, (sx, sy)) where (sx, sy) maps display pixels
+    back to `bgr` pixels.
+    """
+    h, w = bgr.shape[:2]
+    f = _DISPLAY_MAX_DIM / float(max(h, w))
+    if f >= 1.0: return qimage_from_bgr(bgr), bgr, (1.0, 1.0)
+    import cv2  # lazy: keeps OpenCV off the startup path
+    disp = cv2.resize(bgr, None, fx=f, fy=f, interpolation=cv2.INTER_AREA)
+    return qimage_from_bgr(disp), disp, (w / disp.shape[1], h / disp.shape[0])
+
+class _LoadSignals(QtCore.QObject):
+    done = QtCore.Signal(int, str, object, object)          # token, path, bgr, (qimage, backing, scale)
+    failed = QtCore.Signal(int, str, str)                   # token, path, error
+
+class _LoadTask(QtCore.QRunnable):
+    """Decode an image on the thread pool. Only CPU-side objects (QImage, ndarray)
+    are built here; the QPixmap is created on the UI thread."""
+    def __init__(self, token, path):
+        super().__init__()
+        self.token=token; self.path=path; self.signals=_LoadSignals()
+
+    def run(self):
+        try:
+            import cv2  # lazy: first import happens here, off the UI thread
+            # libjpeg-turbo decode straight to a contiguous BGR array; reading the bytes
+            # ourselves also works for non-ASCII paths, which cv2.imread rejects on Windows
+            # IGNORE_ORIENTATION: keep the raw pixel frame (as PIL's Image.open did), so saved
+            # annotations line up with the stored pixels regardless of the EXIF rotation tag
+            bgr = cv2.imdecode(np.fromfile(self.path, np.uint8),
+                               cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+            if bgr is None: raise ValueError("unsupported or unreadable image")
+            assert bgr.flags['C_CONTIGUOUS']
+            disp = display_qimage(bgr)
+        except Exception as ex:
+            self.signals.failed.emit(self.token, self.path, str(ex)); return
+        self.signals.done.emit(self.token, self.path, bgr, disp)
+
+class _ScaleSignals(QtCore.QObject):
+    done = QtCore.Signal(int, object, object)  # token, px_per_mm (or None), corners
+    failed = QtCore.Signal(int, str)           # token, error
+
+class _ScaleTask(QtCore.QRunnable):
+    """Run ArUco scale detection on the thread pool (OpenCV releases the GIL)."""
+    def __init__(self, token, img_np, marker_mm):
+        super().__init__()
+        self.token=token; self.img_np=img_np; self.marker_mm=marker_mm
+        self.signals=_ScaleSignals()
+
+    def run(self):
+        try:
+            v, corners, _ = detect_aruco_scale(self.img_np, self.marker_mm)
+        except Exception as ex:
+            self.signals.failed.emit(self.token, str(ex)); return
+        self.signals.done.emit(self.token, v, corners)
+
+class MeasureText(QGraphicsItem):
+    """Drop-in for QGraphicsSimpleTextItem that keeps its glyph layout in a QStaticText,
+    so repaints with unchanged text reuse it instead of rebuilding a glyph path."""
+    def __init__(self, text=""):
+        super().__init__()
+        self._font = QtGui.QFont(); self._brush = QtGui.QBrush(Qt.black)
+        self._static = QtGui.QStaticText(text); self._static.setTextFormat(Qt.PlainText)
+        self._static.prepare(QtGui.QTransform(), self._font)
+
+    def setText(self, text):
+        self.prepareGeometryChange(); self._static.setText(text)
+
+    def setBrush(self, brush):
+        self._brush = brush; self.update()
+
+    def boundingRect(self):
+        sz = self._static.size()
+        return QRectF(0, 0, sz.width(), sz.height())
+
+    def paint(self, painter, option, widget=None):
+        painter.setFont(self._font); painter.setPen(self._brush.color())
+        painter.drawStaticText(0, 0, self._static)
+
+def _cosmetic_pen(color, width=2):
+    """Pen whose width is in device pixels, so zooming doesn't change line weight."""
+    pen = QtGui.QPen(color, width); pen.setCosmetic(True)
+    return pen
 
 class Canvas(QGraphicsView):
+    # emitted when a detect_scale() run finishes: (px_per_mm or None, still for the shown image)
+    scale_detected = QtCore.Signal(object, bool)
+
+    # pens/brushes shared by every stroke and every canvas
+    _PEN_BOX_DRAG  = _cosmetic_pen(Qt.green);  _PEN_BOX_DONE  = _cosmetic_pen(Qt.cyan)
+    _PEN_LINE_DRAG = _cosmetic_pen(Qt.yellow); _PEN_LINE_DONE = _cosmetic_pen(Qt.magenta)
+    _PEN_MARKER    = _cosmetic_pen(Qt.red)
+    _BRUSH_TEXT_DRAG = QtGui.QBrush(Qt.black); _BRUSH_TEXT_DONE = QtGui.QBrush(Qt.darkMagenta)
+
     def __init__(self, labels):
         super().__init__()
-        self.setRenderHints(QtGui.QPainter.Antialiasing | QtGui.QPainter.SmoothPixmapTransform)
+        # no Antialiasing (overlays are mostly axis-aligned boxes, AA ~doubles their cost) and
+        # no view-wide SmoothPixmapTransform: the photo item picks its own filter (see wheelEvent)
         self.scene = QGraphicsScene(self); self.setScene(self.scene)
+        # few, frequently added/removed items: a BSP index costs more than it saves
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        # GL viewport when a context can be created (VEICHI_NO_GL=1 forces raster): it speeds
+        # up compositing/blitting only; the photo's device cache is still rasterised on the
+        # CPU at each zoom level. Partial updates buy nothing with GL, so repaint it all;
+        # the raster viewport keeps the default minimal-region updates.
+        if _gl_available():
+            self.setViewport(QOpenGLWidget())
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
 
         self.pix=None; self.img_path=None; self.img_np=None
-        self.labels = labels; self.current_label = labels[0] if labels else ""
+        self.labels = list(labels); self.current_label = labels[0] if labels else ""
+        self._label_ids = {l:i for i,l in enumerate(self.labels)}
         self.tool='box'; self.px_per_mm=None
 
-        self.shapes=[]
+        self._shapes = np.zeros(64, dtype=_SHAPE_DTYPE); self._nshapes = 0
         self._item=None; self._start=None
-        self._measure_text=None
-        self._graphics_stack=[]
+        self._measure_text=None; self._last_measure_txt=""  # live label + its current text
+        self._graphics_stack=[]  # one scene item (or group) per shape, for undo
+
+        self._marker_item=None  # outline of the last detected ArUco markers
+
+        # coalesce drag updates to ~60 Hz instead of one per mouse sample
+        self._pending_move=None; self._last_p=None
+        self._move_timer = QtCore.QTimer(self); self._move_timer.setInterval(16)
+        self._move_timer.setSingleShot(True); self._move_timer.timeout.connect(self._flush_move)
+        # bilinear image filtering is restored once the wheel has been idle this long
+        self._zoom_timer = QtCore.QTimer(self); self._zoom_timer.setInterval(150)
+        self._zoom_timer.setSingleShot(True); self._zoom_timer.timeout.connect(self._zoom_settled)
 
         # for calibration helpers
         self._last_line_px=None
@@ -40,27 +194,53 @@ class Canvas(QGraphicsView):
         self._scale_beta  = 0.0
         self.depth_mm_current = None
 
+        # background decode; results older than _load_token are dropped
+        self._load_token=0; self._load_task=None
+        # background marker detection; bumped whenever the shown image changes
+        self._scale_token=0; self._scale_task=None
+
     # ----------------- IO -----------------
     def load(self, path):
-        self.scene.clear(); self.pix=None
-        self.shapes=[]; self._graphics_stack.clear()
+        """Decode `path` off the UI thread; the scene is swapped when it is ready."""
+        self._load_token += 1
+        task = _LoadTask(self._load_token, path)
+        task.signals.done.connect(self._on_loaded)
+        task.signals.failed.connect(self._on_load_failed)
+        self._load_task = task  # keep the signals object alive until delivery
+        QtCore.QThreadPool.globalInstance().start(task)
+
+    def _on_load_failed(self, token, path, err):
+        if token != self._load_token: return
+        QMessageBox.warning(self, "Open image", f"Could not open {path}:\n{err}")
+
+    def _on_loaded(self, token, path, bgr, disp):
+        if token != self._load_token: return  # superseded by a newer load
+        self.scene.clear(); self.pix=None; self._marker_item=None; self._scale_token += 1
+        self._nshapes=0; self._graphics_stack.clear()
         self.px_per_mm=None; self._item=None; self._start=None; self._measure_text=None
         self._last_line_px=None; self._recent_lines.clear()
         self._scale_alpha=1.0; self._scale_beta=0.0; self.depth_mm_current=None
 
         self.img_path = path
-        img = Image.open(path).convert("RGB")
-        self.img_np = np.array(img)[:, :, ::-1]  # BGR
-        self.pix = QGraphicsPixmapItem(QtGui.QPixmap.fromImage(qimage_from_pil(img)))
-        self.scene.addItem(self.pix)
-        self.fitInView(self.pix, Qt.KeepAspectRatio)
+        self.img_np = bgr
+        qimg, backing, scale = disp
+        self._show_pixmap(_pix_from_image(qimg), backing, scale)
 
     def replace_with_np(self, np_bgr):
         """Replace canvas image (e.g., rectified)."""
-        self.scene.clear(); self.pix=None
-        self.img_np = np_bgr
-        img = Image.fromarray(np_bgr[:, :, ::-1])  # back to RGB
-        self.pix = QGraphicsPixmapItem(QtGui.QPixmap.fromImage(qimage_from_pil(img)))
+        self.scene.clear(); self.pix=None; self._marker_item=None; self._scale_token += 1
+        bgr = np.ascontiguousarray(np_bgr)
+        self.img_np = bgr
+        qimg, backing, scale = display_qimage(bgr)
+        self._show_pixmap(_pix_from_image(qimg), backing, scale)
+
+    def _show_pixmap(self, pixmap, keepalive, scale):
+        """Add the photo item; it is scaled so scene units stay full-resolution image pixels."""
+        self.pix = QGraphicsPixmapItem(pixmap)
+        self.pix._keepalive = keepalive
+        if scale != (1.0, 1.0): self.pix.setTransform(QtGui.QTransform.fromScale(*scale))
+        self.pix.setCacheMode(QGraphicsItem.DeviceCoordinateCache)  # static background
+        self.pix.setTransformationMode(Qt.SmoothTransformation)
         self.scene.addItem(self.pix)
         self.fitInView(self.pix, Qt.KeepAspectRatio)
 
@@ -70,25 +250,65 @@ class Canvas(QGraphicsView):
             "px_per_mm": self.px_per_mm,
             "scale_correction": {"alpha": self._scale_alpha, "beta": self._scale_beta},
             "depth_mm": self.depth_mm_current,
-            "shapes": self.shapes
+            "shapes": self._shape_dicts()
         }
 
+    # --------------- Shape table ---------------
+    def _label_id(self, label):
+        lid = self._label_ids.get(label)
+        if lid is None:
+            lid = self._label_ids[label] = len(self.labels); self.labels.append(label)
+        return lid
+
+    def _add_shape(self, kind, pts, mm=None, mm_c=None, depth=None):
+        n = self._nshapes
+        if n == len(self._shapes):  # grow by 2x
+            grown = np.zeros(2*n, dtype=_SHAPE_DTYPE); grown[:n] = self._shapes
+            self._shapes = grown
+        nan = np.nan
+        self._shapes[n] = (kind, self._label_id(self.current_label), pts,
+                           nan if mm is None else mm, nan if mm_c is None else mm_c,
+                           nan if depth is None else depth)
+        self._nshapes = n+1
+
+    def _shape_dicts(self):
+        """Materialize the shape table as the saved list-of-dicts layout."""
+        rows = self._shapes[:self._nshapes]; labels = self.labels
+        # one tolist() per column instead of unboxing record by record
+        cols = zip(rows["kind"].tolist(), rows["label"].tolist(), rows["pts"].tolist(),
+                   rows["mm"].tolist(), rows["mm_c"].tolist(), rows["depth"].tolist())
+        out=[]
+        for kind, lid, pts, mm, mm_c, depth in cols:
+            if kind == _SHAPE_LINE:
+                out.append({"type":"line", "label":labels[lid], "points":pts,
+                            "mm_value":_none_if_nan(mm), "mm_corrected":_none_if_nan(mm_c),
+                            "depth_mm":_none_if_nan(depth)})
+            else:
+                out.append({"type":"box", "label":labels[lid], "points":pts})
+        return out
+
     # --------------- View helpers ---------------
-    def wheelEvent(self,e): self.scale(1.2,1.2) if e.angleDelta().y()>0 else self.scale(1/1.2,1/1.2)
+    def wheelEvent(self,e):
+        if self.pix:  # nearest-neighbour while zooming; full-image bilinear per frame is the hot cost
+            self.pix.setTransformationMode(Qt.FastTransformation); self._zoom_timer.start()
+        self.scale(1.2,1.2) if e.angleDelta().y()>0 else self.scale(1/1.2,1/1.2)
+
+    def _zoom_settled(self):
+        if self.pix: self.pix.setTransformationMode(Qt.SmoothTransformation)
 
     # --------------- Drawing ---------------
     def mousePressEvent(self,e):
         if e.button()==Qt.LeftButton and self.pix:
             p=self.mapToScene(e.pos())
             if self.tool=='box':
-                self._item=QGraphicsRectItem(QRectF(p,p)); self._item.setPen(QtGui.QPen(Qt.green,2))
+                self._item=QGraphicsRectItem(QRectF(p,p)); self._item.setPen(self._PEN_BOX_DRAG)
             else:
-                self._item=QGraphicsLineItem(QtCore.QLineF(p,p)); self._item.setPen(QtGui.QPen(Qt.yellow,2))
-                self._measure_text = QGraphicsSimpleTextItem("")
-                self._measure_text.setBrush(QtGui.QBrush(Qt.black))
+                self._item=QGraphicsLineItem(QtCore.QLineF(p,p)); self._item.setPen(self._PEN_LINE_DRAG)
+                self._measure_text = MeasureText(""); self._last_measure_txt = ""
+                self._measure_text.setBrush(self._BRUSH_TEXT_DRAG)
                 self.scene.addItem(self._measure_text)
             self.scene.addItem(self._item)
-            self._start=p
+            self._start=p; self._last_p=p
         else: super().mousePressEvent(e)
 
     def _correct_mm(self, mm, y):
@@ -97,38 +317,53 @@ class Canvas(QGraphicsView):
 
     def mouseMoveEvent(self,e):
         if self._item and self._start:
-            p=self.mapToScene(e.pos())
-            if isinstance(self._item,QGraphicsRectItem):
-                self._item.setRect(QRectF(self._start,p).normalized())
-            else:
-                self._item.setLine(QtCore.QLineF(self._start,p))
-                l=self._item.line()
-                mid=QPointF((l.x1()+l.x2())/2.0,(l.y1()+l.y2())/2.0)
-                if self.px_per_mm:
-                    base_mm = l.length()/self.px_per_mm
-                    shown = self._correct_mm(base_mm, mid.y())
-                    txt = f"{shown:.1f} mm"
-                else:
-                    txt = f"{l.length():.0f} px"
-                if self._measure_text:
-                    self._measure_text.setText(txt); self._measure_text.setPos(mid)
+            self._pending_move=self.mapToScene(e.pos())
+            if not self._move_timer.isActive(): self._move_timer.start()
         else: super().mouseMoveEvent(e)
 
+    def _flush_move(self):
+        """Apply the latest pending drag position to the rubber-band item."""
+        p=self._pending_move; self._pending_move=None
+        if p is None or not (self._item and self._start): return
+        if p == self._last_p: return  # re-sent event (scroll/wheel) without motion
+        self._last_p = p
+        if isinstance(self._item,QGraphicsRectItem):
+            self._item.setRect(QRectF(self._start,p).normalized())
+        else:
+            self._item.setLine(QtCore.QLineF(self._start,p))
+            # geometry straight from the two points, without round-tripping QLineF
+            x1, y1, x2, y2 = self._start.x(), self._start.y(), p.x(), p.y()
+            dx, dy = x2-x1, y2-y1
+            length_px = math.sqrt(dx*dx + dy*dy)
+            mid=QPointF(0.5*(x1+x2), 0.5*(y1+y2))
+            if self.px_per_mm:
+                base_mm = length_px/self.px_per_mm
+                shown = self._correct_mm(base_mm, mid.y())
+                txt = f"{shown:.1f} mm"
+            else:
+                txt = f"{length_px:.0f} px"
+            if self._measure_text:
+                # only re-layout the label when the displayed text changes
+                if txt != self._last_measure_txt:
+                    self._measure_text.setText(txt); self._last_measure_txt = txt
+                self._measure_text.setPos(mid)
+
     def mouseReleaseEvent(self,e):
         if e.button()==Qt.LeftButton and self._item:
-            created=[self._item]
+            self._move_timer.stop(); self._flush_move()  # commit the last drag position
+            created=self._item
             if isinstance(self._item,QGraphicsRectItem):
                 r=self._item.rect()
                 if r.width()>5 and r.height()>5:
-                    self.shapes.append({"type":"box","label":self.current_label,
-                                        "points":[r.x(),r.y(),r.width(),r.height()]})
-                    self._item.setPen(QtGui.QPen(Qt.cyan,2))
+                    self._add_shape(_SHAPE_BOX, (r.x(),r.y(),r.width(),r.height()))
+                    self._item.setPen(self._PEN_BOX_DONE)
                 else:
-                    self.scene.removeItem(self._item); created=[]
+                    self.scene.removeItem(self._item); created=None
             else:
                 l=self._item.line()
-                if l.length()>5:
-                    self._last_line_px = float(l.length())
+                dx, dy = l.dx(), l.dy(); lsq = dx*dx + dy*dy
+                if lsq > 25:  # longer than 5 px; sqrt only for kept lines
+                    self._last_line_px = math.sqrt(lsq)
                     x1,y1,x2,y2 = l.x1(), l.y1(), l.x2(), l.y2()
                     ymid = 0.5*(y1+y2)
                     base_mm = (self._last_line_px/self.px_per_mm) if self.px_per_mm else None
@@ -140,41 +375,66 @@ class Canvas(QGraphicsView):
                         if len(self._recent_lines) > 2:
                             self._recent_lines = self._recent_lines[-2:]
 
-                    self.shapes.append({
-                        "type":"line","label":self.current_label,
-                        "points":[x1,y1,x2,y2],
-                        "mm_value": base_mm,
-                        "mm_corrected": mm_corr,
-                        "depth_mm": self.depth_mm_current
-                    })
-                    self._item.setPen(QtGui.QPen(Qt.magenta,2))
+                    self._add_shape(_SHAPE_LINE, (x1,y1,x2,y2), base_mm, mm_corr, self.depth_mm_current)
+                    self._item.setPen(self._PEN_LINE_DONE)
                     if self._measure_text:
                         shown = mm_corr if mm_corr is not None else base_mm
-                        txt = f"{shown:.1f} mm" if shown is not None else f"{l.length():.0f} px"
+                        txt = f"{shown:.1f} mm" if shown is not None else f"{self._last_line_px:.0f} px"
                         self._measure_text.setText(txt)
-                        self._measure_text.setBrush(QtGui.QBrush(Qt.darkMagenta))
-                        created.append(self._measure_text); self._measure_text=None
+                        self._measure_text.setBrush(self._BRUSH_TEXT_DONE)
+                        # line + label become one item: one removeItem on undo
+                        created = QtWidgets.QGraphicsItemGroup(); self.scene.addItem(created)
+                        created.addToGroup(self._item); created.addToGroup(self._measure_text)
+                        self._measure_text=None
                 else:
                     self.scene.removeItem(self._item)
                     if self._measure_text: self.scene.removeItem(self._measure_text)
-                    created=[]; self._measure_text=None
-            if created: self._graphics_stack.append(created)
+                    created=None; self._measure_text=None
+            if created is not None: self._graphics_stack.append(created)
             self._item=None; self._start=None
         else: super().mouseReleaseEvent(e)
 
     # --------------- Tools / features ---------------
     def set_tool(self, name:str): self.tool=name
     def undo(self):
-        if not self._graphics_stack or not self.shapes: return
-        for it in self._graphics_stack.pop(): self.scene.removeItem(it)
-        self.shapes.pop()
+        if not self._graphics_stack or not self._nshapes: return
+        self.scene.removeItem(self._graphics_stack.pop())
+        self._nshapes -= 1
 
     def detect_scale(self, marker_mm):
-        if self.img_np is None: return None
-        v, _, _ = detect_aruco_scale(self.img_np, marker_mm)
-        if not v: return None
-        self.px_per_mm = v
-        return v
+        """Start marker detection off the UI thread; the result arrives via scale_detected.
+        Returns False when there is no image to detect on."""
+        if self.img_np is None: return False
+        self._scale_token += 1
+        task = _ScaleTask(self._scale_token, self.img_np, marker_mm)
+        task.signals.done.connect(self._on_scale_done)
+        task.signals.failed.connect(self._on_scale_failed)
+        self._scale_task = task  # keep the signals object alive until delivery
+        QtCore.QThreadPool.globalInstance().start(task)
+        return True
+
+    def _on_scale_done(self, token, v, corners):
+        current = token == self._scale_token  # else the image changed while detecting
+        if current and v:
+            self.px_per_mm = v
+            self._show_markers(corners)
+        self.scale_detected.emit(v, current)
+
+    def _on_scale_failed(self, token, err):
+        QMessageBox.warning(self, "Detect scale", f"Marker detection failed:\n{err}")
+        self.scale_detected.emit(None, token == self._scale_token)
+
+    def _show_markers(self, corners):
+        """Outline detected markers with a single path item (one paint, one bounding box)."""
+        if self._marker_item is not None: self.scene.removeItem(self._marker_item)
+        path = QtGui.QPainterPath()
+        for pts in (c[0].tolist() for c in corners):  # one unboxing call per marker
+            path.moveTo(*pts[0])
+            for x, y in pts[1:]: path.lineTo(x, y)
+            path.closeSubpath()
+        self._marker_item = QtWidgets.QGraphicsPathItem(path)
+        self._marker_item.setPen(self._PEN_MARKER)
+        self.scene.addItem(self._marker_item)
 
     def rectify_topdown(self, marker_mm):
         if self.img_np is None: return None
@@ -188,17 +448,13 @@ class Canvas(QGraphicsView):
         """Single-line scale overwrite (simple)."""
         if not self._last_line_px or known_mm <= 0: return None
         self.px_per_mm = float(self._last_line_px) / float(known_mm)
-        # refresh mm_value / corrected for all stored lines
-        new=[]
-        for s in self.shapes:
-            if s.get("type")=="line":
-                x1,y1,x2,y2 = s["points"]
-                pix = float(np.hypot(x2-x1, y2-y1))
-                base_mm = pix / self.px_per_mm
-                s["mm_value"] = base_mm
-                s["mm_corrected"] = self._correct_mm(base_mm, 0.5*(y1+y2))
-            new.append(s)
-        self.shapes=new
+        # refresh mm_value / corrected for all stored lines in one vector pass
+        rows = self._shapes[:self._nshapes]
+        line = rows["kind"] == _SHAPE_LINE
+        pts = rows["pts"][line]  # (N,4)
+        base_mm = np.hypot(pts[:,2]-pts[:,0], pts[:,3]-pts[:,1]) / self.px_per_mm
+        rows["mm"][line] = base_mm
+        rows["mm_c"][line] = self._correct_mm(base_mm, 0.5*(pts[:,1]+pts[:,3]))
         return self.px_per_mm
 
     def calibrate_depth_two_lines(self, true_width_mm, depth_mm):
@@ -209,23 +465,22 @@ class Canvas(QGraphicsView):
         if len(self._recent_lines) < 2 or not self.px_per_mm:
             return None
         (y1, m1), (y2, m2) = self._recent_lines[-2:]
-        A = np.array([[m1, m1*y1],
-                      [m2, m2*y2]], dtype=float)
-        b = np.array([true_width_mm, true_width_mm], dtype=float)
-        a, beta = np.linalg.lstsq(A, b, rcond=None)[0]
+        # closed-form inverse of [[m1, m1*y1], [m2, m2*y2]] applied to b = (w, w)
+        det = m1*m2*(y2-y1)
+        if abs(det) < 1e-12:
+            return None  # lines at the same height (or zero length): no depth information
+        b1 = b2 = float(true_width_mm)
+        a = (m2*y2*b1 - m1*y1*b2) / det
+        beta = (m1*b2 - m2*b1) / det
         self._scale_alpha, self._scale_beta = float(a), float(beta)
         self.depth_mm_current = float(depth_mm)
 
-        # Recompute corrected values for existing lines
-        new=[]
-        for s in self.shapes:
-            if s.get("type")=="line" and s.get("mm_value") is not None:
-                x1,y1,x2,y2 = s["points"]
-                ymid = 0.5*(y1+y2)
-                s["mm_corrected"] = self._correct_mm(s["mm_value"], ymid)
-                s["depth_mm"] = self.depth_mm_current
-            new.append(s)
-        self.shapes = new
+        # Recompute corrected values for existing (measured) lines
+        rows = self._shapes[:self._nshapes]
+        sel = (rows["kind"] == _SHAPE_LINE) & ~np.isnan(rows["mm"])
+        pts = rows["pts"][sel]
+        rows["mm_c"][sel] = self._correct_mm(rows["mm"][sel], 0.5*(pts[:,1]+pts[:,3]))
+        rows["depth"][sel] = self.depth_mm_current
         return a, beta
 
 class Main(QMainWindow):
@@ -233,13 +488,15 @@ class Main(QMainWindow):
         super().__init__(); self.setWindowTitle(APP_TITLE); self.resize(1280,820)
 
         # Labels config
-        labels_cfg = json.load(open(os.path.join(os.path.dirname(__file__),"config","labels.json")))
+        labels_cfg = _load_labels_cfg()
         labels = labels_cfg["classes"]
 
         self.canvas = Canvas(labels)
 
         # Left panel widgets
-        self.cmb = QComboBox(); [self.cmb.addItem(x) for x in labels]
+        self.cmb = QComboBox()
+        self.cmb.blockSignals(True); self.cmb.addItems(labels); self.cmb.blockSignals(False)
+        self.cmb.setCurrentIndex(0)
         self.cmb.currentTextChanged.connect(lambda s: setattr(self.canvas,"current_label",s))
 
         self.mm = QDoubleSpinBox(); self.mm.setRange(1,500); self.mm.setDecimals(2)
@@ -265,7 +522,8 @@ class Main(QMainWindow):
 
         bOpen  = QPushButton("Open image");        bOpen.clicked.connect(self._open)
         bRect  = QPushButton("Rectify Top-down");  bRect.clicked.connect(self._rectify)
-        bScale = QPushButton("Detect Scale");      bScale.clicked.connect(self._scale)
+        self.bScale = bScale = QPushButton("Detect Scale"); bScale.clicked.connect(self._scale)
+        self.canvas.scale_detected.connect(self._on_scale)
         bCal   = QPushButton("Calibrate from last line"); bCal.clicked.connect(self._calibrate)
         bCalDepth = QPushButton("Calibrate depth (last 2 lines)")
         bCalDepth.clicked.connect(self._calibrate_depth)
@@ -314,8 +572,13 @@ class Main(QMainWindow):
         self.lbl_pxmm.setText(f"px/mm: {v:.3f}" if v else "px/mm: —")
 
     def _scale(self):
-        v=self.canvas.detect_scale(float(self.mm.value()))
-        self.lbl_pxmm.setText(f"px/mm: {v:.3f}" if v else "px/mm: —")
+        if not self.bScale.isEnabled(): return  # detection already running (D shortcut)
+        if self.canvas.detect_scale(float(self.mm.value())): self.bScale.setEnabled(False)
+        else: self.lbl_pxmm.setText("px/mm: —")
+
+    def _on_scale(self, v, current):
+        self.bScale.setEnabled(True)
+        if current: self.lbl_pxmm.setText(f"px/mm: {v:.3f}" if v else "px/mm: —")
 
     def _calibrate(self):
         v=self.canvas.calibrate_from_last_line(float(self.calib_mm.value()))
@@ -333,7 +596,15 @@ class Main(QMainWindow):
     def _save(self):
         if not self.canvas.img_path: return
         out=self.canvas.img_path + ".annotations.json"
-        with open(out,"w") as f: json.dump(self.canvas.to_json(),f,indent=2)
+        data=self.canvas.to_json()
+        if orjson:  # C serializer; handles numpy scalars natively
+            buf = orjson.dumps(data, option=orjson.OPT_INDENT_2|orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            buf = json.dumps(data, indent=2).encode("utf-8")
+        # single write to a temp file, then atomic rename: no half-written annotations on crash
+        tmp = out + ".tmp"
+        with open(tmp,"wb") as f: f.write(buf)
+        os.replace(tmp, out)
         QMessageBox.information(self,"Saved",out)
 
 if __name__=="__main__":
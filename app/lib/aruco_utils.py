@@ -1,13 +1,56 @@
 # app/lib/aruco_utils.py
-import cv2
+# cv2 is imported inside the functions: it is slow to import and only needed once
+# the user detects or rectifies, so keep it off the app's startup path
+import threading
 import numpy as np
 
+# built once, on first detection; afterwards only detectMarkers runs per call
+_ARUCO_DETECTOR = None
+
+def _get_detector():
+    global _ARUCO_DETECTOR
+    if _ARUCO_DETECTOR is None:
+        import cv2
+        dict_ = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
+        params = cv2.aruco.DetectorParameters()
+        # bench markers are large relative to the (capped) image: reject small contours
+        # early and threshold at a single window size instead of sweeping 3..23
+        params.minMarkerPerimeterRate = 0.05
+        params.adaptiveThreshWinSizeMin = 23
+        params.adaptiveThreshWinSizeMax = 23
+        params.adaptiveThreshWinSizeStep = 10
+        # sub-pixel corners for px/mm accuracy; only runs on the few accepted markers
+        params.cornerRefinementMethod = cv2.aruco.CORNER_REFINE_SUBPIX
+        _ARUCO_DETECTOR = cv2.aruco.ArucoDetector(dict_, params)
+    return _ARUCO_DETECTOR
+
+# grayscale scratch buffer reused across calls; reallocated only when the size changes
+_GRAY_BUF = [None]
+# detection may run on a worker thread while the UI thread rectifies; the scratch
+# buffer and the shared detector are used under this lock
+_DETECT_LOCK = threading.Lock()
+
+# long-side cap for detection; markers stay tens of px wide at this size
+_DETECT_MAX_DIM = 1600
+
 def _detect(image_bgr):
-    """Return (corners, ids) from an OpenCV BGR image."""
-    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-    dict_ = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_4X4_50)
-    det = cv2.aruco.ArucoDetector(dict_, cv2.aruco.DetectorParameters())
-    corners, ids, _ = det.detectMarkers(gray)
+    """
+    Return (corners, ids) from an OpenCV BGR image.
+    Large images are searched at reduced resolution; corners are always
+    returned in full-resolution pixel coordinates.
+    """
+    import cv2
+    scale = _DETECT_MAX_DIM / float(max(image_bgr.shape[:2]))
+    if scale < 1.0:
+        image_bgr = cv2.resize(image_bgr, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    with _DETECT_LOCK:
+        gray = _GRAY_BUF[0]
+        if gray is None or gray.shape != image_bgr.shape[:2]:
+            gray = _GRAY_BUF[0] = np.empty(image_bgr.shape[:2], np.uint8)
+        cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+        corners, ids, _ = _get_detector().detectMarkers(gray)
+    if scale < 1.0 and ids is not None:
+        corners = tuple(c / scale for c in corners)
     return corners, (ids.flatten() if ids is not None else None)
 
 def detect_aruco_scale(image_bgr, marker_size_mm=60.0):
@@ -18,27 +61,19 @@ def detect_aruco_scale(image_bgr, marker_size_mm=60.0):
     corners, ids = _detect(image_bgr)
     if ids is None or len(corners) == 0:
         return None, [], []
-    side_px_vals = []
-    for c in corners:
-        pts = c[0]
-        sides = [
-            np.linalg.norm(pts[0] - pts[1]),
-            np.linalg.norm(pts[1] - pts[2]),
-            np.linalg.norm(pts[2] - pts[3]),
-            np.linalg.norm(pts[3] - pts[0]),
-        ]
-        mean_side = float(np.mean(sides))
-        side_px_vals.append(mean_side / float(marker_size_mm))
-    return float(np.mean(side_px_vals)), corners, ids
+    pts = np.stack([c[0] for c in corners]).astype(np.float32, copy=False)  # (N,4,2)
+    d = pts - np.roll(pts, -1, axis=1)           # edges 0-1, 1-2, 2-3, 3-0
+    sides = np.sqrt((d*d).sum(axis=-1))          # (N,4)
+    # every marker has 4 sides, so the global mean equals the mean of per-marker means
+    return float(sides.mean(dtype=np.float64)) / float(marker_size_mm), corners, ids
 
 def _order_centers_tl_tr_br_bl(corners):
     """Order 4 marker centers into TL, TR, BR, BL by position."""
-    centers = np.array([c[0].mean(axis=0) for c in corners], dtype=np.float32)  # (N,2)
-    idx_y = np.argsort(centers[:, 1])
-    top = centers[idx_y[:2]]
-    bottom = centers[idx_y[2:]]
-    tl, tr = top[np.argsort(top[:, 0])]
-    bl, br = bottom[np.argsort(bottom[:, 0])]
+    centers = np.stack([c[0] for c in corners]).mean(axis=1)  # (N,2), one reduce
+    # N == 4: sorting small Python lists beats three NumPy argsort calls
+    pts = sorted(centers.tolist(), key=lambda p: p[1])
+    tl, tr = sorted(pts[:2], key=lambda p: p[0])
+    bl, br = sorted(pts[2:], key=lambda p: p[0])
     return np.array([tl, tr, br, bl], dtype=np.float32)
 
 def rectify_topdown_with_aruco(image_bgr, marker_size_mm=60.0):
@@ -46,6 +81,7 @@ def rectify_topdown_with_aruco(image_bgr, marker_size_mm=60.0):
     Warp to a fronto-parallel view of the bench using 4 ArUco markers.
     Returns (warped_bgr, H, px_per_mm) or (None, None, None).
     """
+    import cv2
     corners, ids = _detect(image_bgr)
     if ids is None or len(corners) < 4:
         return None, None, None